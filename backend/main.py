@@ -2,7 +2,9 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
+import numpy as np
+from numba import njit, prange
 import simpy
 import random
 import salabim as sim
@@ -12,8 +14,25 @@ from skopt import gp_minimize
 from skopt.space import Real
 from deap import base, creator, tools
 import statistics
-
-app = FastAPI()
+import copy
+import functools
+import os
+import sys
+import time
+import inspect
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from dataclasses import dataclass
+from contextlib import asynccontextmanager
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Spawn the simulation workers before the first request
+    start_process_pool()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -57,15 +76,74 @@ class ScheduleResult(BaseModel):
     schedule: List[TaskLog]
     permutation: List[int]
 
+def build_schedule_result(makespan: float, log: List[tuple], permutation: List[int]) -> ScheduleResult:
+    # Log entries are internal (jobId, stageId, machineId, globalMachineId, start, end) tuples
+    schedule = [
+        TaskLog.model_construct(
+            jobId=job_id,
+            stageId=stage_id,
+            machineId=machine_id,
+            globalMachineId=global_machine_id,
+            startTime=start_time,
+            endTime=end_time,
+        )
+        for job_id, stage_id, machine_id, global_machine_id, start_time, end_time in log
+    ]
+    return ScheduleResult(makespan=makespan, schedule=schedule, permutation=permutation)
+
+def stage_offsets(machines_per_stage: List[int]) -> List[int]:
+    # Global machine ID of the first machine in each stage
+    return list(accumulate(machines_per_stage[:-1], initial=0))
+
+def is_single_machine(machines_per_stage: List[int]) -> bool:
+    return all(c == 1 for c in machines_per_stage)
+
+def kernel_matrix(P: np.ndarray) -> np.ndarray:
+    # int32 when every time is integral and the total fits, float32 otherwise
+    if np.all(P == np.rint(P)) and np.abs(P).sum() <= np.iinfo(np.int32).max:
+        return np.ascontiguousarray(P, dtype=np.int32)
+    return np.asarray(P, dtype=np.float32)
+
+@dataclass(frozen=True)
+class SimulationContext:
+    # Per-request instance data shared by every backend and evaluator
+    P: np.ndarray                 # (numJobs, numStages) processing times, rows in instance.jobs order
+    P_kernel: np.ndarray          # int32/float32 copy of P read by the makespan kernels
+    job_ids: np.ndarray           # job id of each row of P
+    id_to_row: Dict[int, int]
+    machines_per_stage: List[int]
+    global_offsets: List[int]
+    single_machine: bool
+
+    @classmethod
+    def from_instance(cls, instance: Instance) -> 'SimulationContext':
+        # float64 for the simulations; explicit shape so jobs=[] gives (0, numStages)
+        P = np.array([j.processingTimes for j in instance.jobs], dtype=np.float64).reshape(
+            len(instance.jobs), instance.numStages)
+        return cls(
+            P=P,
+            P_kernel=kernel_matrix(P),
+            job_ids=np.array([j.id for j in instance.jobs], dtype=np.int64),
+            id_to_row={j.id: i for i, j in enumerate(instance.jobs)},
+            machines_per_stage=list(instance.machinesPerStage),
+            global_offsets=stage_offsets(instance.machinesPerStage),
+            single_machine=is_single_machine(instance.machinesPerStage),
+        )
+
+    @property
+    def num_stages(self) -> int:
+        return self.P.shape[1]
+
 # --- SimPy Implementation ---
 
-def run_simpy_simulation(instance: Instance, permutation: List[int]) -> ScheduleResult:
+def simulate_simpy(ctx: SimulationContext, permutation: List[int],
+                   schedule_log: Optional[List[tuple]] = None) -> float:
+    # Makespan of permutation; each task is appended to schedule_log if one is given
     env = simpy.Environment()
     
     # Create resources for each stage
-    machines = [simpy.Resource(env, capacity=c) for c in instance.machinesPerStage]
-    
-    schedule_log: List[TaskLog] = []
+    machines = [simpy.Resource(env, capacity=c) for c in ctx.machines_per_stage]
+    global_offsets = ctx.global_offsets
 
     def job_process(env, job_id, processing_times):
         for stage_idx, proc_time in enumerate(processing_times):
@@ -79,146 +157,344 @@ def run_simpy_simulation(instance: Instance, permutation: List[int]) -> Schedule
                 start_time = env.now
                 yield env.timeout(proc_time)
                 end_time = env.now
+
+                if schedule_log is None:
+                    continue
                 
                 # Calculate global machine ID for viz
-                global_offset = sum(instance.machinesPerStage[:stage_idx])
+                global_offset = global_offsets[stage_idx]
                 machine_id = 0 # Simplified for viz
                 
-                schedule_log.append(TaskLog(
-                    jobId=job_id,
-                    stageId=stage_idx,
-                    machineId=machine_id, 
-                    globalMachineId=global_offset + machine_id,
-                    startTime=start_time,
-                    endTime=end_time
+                schedule_log.append((
+                    job_id, stage_idx, machine_id, global_offset + machine_id, start_time, end_time
                 ))
 
     # Start processes in permutation order
     for job_id in permutation:
-        job = next(j for j in instance.jobs if j.id == job_id)
-        env.process(job_process(env, job.id, job.processingTimes))
+        env.process(job_process(env, job_id, ctx.P[ctx.id_to_row[job_id]]))
 
     env.run()
-    
-    makespan = env.now
-    return ScheduleResult(makespan=makespan, schedule=schedule_log, permutation=permutation)
-
-def optimize_with_random_search(instance: Instance, simulation_func) -> ScheduleResult:
-    best_result = None
-    best_makespan = float('inf')
-    
-    # Use the seed if provided
-    if instance.randomSeed is not None:
-        random.seed(instance.randomSeed)
-    
-    # Run maxIterations times
-    for _ in range(instance.maxIterations):
-        # Generate random permutation
-        perm = list(range(instance.numJobs))
-        random.shuffle(perm)
-        
-        try:
-            result = simulation_func(instance, perm)
-            if result.makespan < best_makespan:
-                best_makespan = result.makespan
-                best_result = result
-        except Exception as e:
-            print(f"Simulation error: {e}")
-            continue
-            
-    if best_result is None:
-        # Fallback to simple 0..N order if all failed
-        perm = list(range(instance.numJobs))
-        return simulation_func(instance, perm)
-        
-    return best_result
+    return env.now
+
+def run_simpy_simulation(ctx: SimulationContext, permutation: List[int]) -> ScheduleResult:
+    schedule_log: List[tuple] = []
+    makespan = simulate_simpy(ctx, permutation, schedule_log)
+    return build_schedule_result(makespan, schedule_log, permutation)
+
+# --- Fast Makespan Evaluation ---
+
+@njit(cache=True, fastmath=True)
+def _makespan_kernel(p_ordered, n, m):
+    # PFSP recurrence over a single completion row; single-machine stages only
+    c = np.zeros(m, dtype=p_ordered.dtype)
+    if n == 0:
+        return c[m - 1]
+    c[0] = p_ordered[0, 0]
+    for j in range(1, m):
+        c[j] = c[j - 1] + p_ordered[0, j]
+    for i in range(1, n):
+        c[0] += p_ordered[i, 0]
+        for j in range(1, m):
+            above = c[j]
+            left = c[j - 1]
+            c[j] = (above if above > left else left) + p_ordered[i, j]
+    return c[m - 1]
+
+def makespan(p: np.ndarray, perm) -> float:
+    # perm may be partial (a subset of rows), e.g. during NEH insertion
+    p_ordered = p[np.asarray(perm, dtype=np.intp)]
+    return float(_makespan_kernel(p_ordered, *p_ordered.shape))
+
+@njit(cache=True, parallel=True)
+def makespan_batch(p, perms):
+    # Parallel over a (B, k) int32 batch of (possibly partial) row permutations
+    n, m = perms.shape[1], p.shape[1]
+    out = np.empty(perms.shape[0], dtype=p.dtype)
+    for b in prange(perms.shape[0]):
+        out[b] = _makespan_kernel(p[perms[b]], n, m)
+    return out
+
+# Compile both kernel dtypes on import so the first request doesn't pay the JIT cost
+for _dtype in (np.int32, np.float32):
+    makespan(np.ones((2, 2), dtype=_dtype), np.arange(2))
+    makespan_batch(np.ones((2, 2), dtype=_dtype), np.zeros((1, 2), dtype=np.int32))
+
+# Searches revisit permutations, so evaluators memoize makespans by permutation tuple
+MAKESPAN_CACHE_SIZE = 100_000
+
+def make_makespan_evaluator(ctx: SimulationContext) -> Callable[[List[int]], float]:
+    if ctx.single_machine:
+        def evaluate(perm_tuple: Tuple[int, ...]) -> float:
+            return makespan(ctx.P_kernel, [ctx.id_to_row[job_id] for job_id in perm_tuple])
+    else:
+        # Parallel machines per stage need the simulation, but not its log
+        def evaluate(perm_tuple: Tuple[int, ...]) -> float:
+            return simulate_simpy(ctx, perm_tuple)
+
+    cached_makespan = functools.lru_cache(maxsize=MAKESPAN_CACHE_SIZE)(evaluate)
+    return lambda perm: cached_makespan(tuple(perm))
+
+def make_batch_makespan_evaluator(ctx: SimulationContext) -> Callable[[List[List[int]]], np.ndarray]:
+    if not ctx.single_machine:
+        evaluate = make_makespan_evaluator(ctx)
+        return lambda perms: np.array([evaluate(perm) for perm in perms])
+
+    cache: Dict[Tuple[int, ...], float] = {}
+
+    def evaluate_batch(perms: List[List[int]]) -> np.ndarray:
+        keys = [tuple(perm) for perm in perms]
+        # Only unseen permutations go to the kernel, each of them once
+        missing = list(dict.fromkeys(key for key in keys if key not in cache))
+        if missing:
+            if len(cache) + len(missing) > MAKESPAN_CACHE_SIZE:
+                cache.clear()
+            rows = np.array([[ctx.id_to_row[job_id] for job_id in key] for key in missing], dtype=np.int32)
+            cache.update(zip(missing, makespan_batch(ctx.P_kernel, rows)))
+        return np.array([cache[key] for key in keys])
+
+    return evaluate_batch
+
+def rows_to_job_ids(ctx: SimulationContext, rows: np.ndarray) -> List[int]:
+    return ctx.job_ids[rows].tolist()
+
+def scores_to_permutation(ctx: SimulationContext, x) -> List[int]:
+    # Random-key decoding: jobs ordered by ascending score (stable on ties)
+    return rows_to_job_ids(ctx, np.argsort(np.asarray(x), kind='stable'))
+
+# Simulation workers, spawned rather than forked since the parent runs Numba and server threads
+PROCESS_POOL_SIZE = os.cpu_count() or 1
+_process_pool: Optional[ProcessPoolExecutor] = None
+# Round trip of one no-op per worker on the warm pool; None until started
+_pool_dispatch_overhead: Optional[float] = None
+
+def _init_pool_worker():
+    # Cache spawn's "<string>" bootstrap file so Salabim's stack walks don't rescan sys.modules
+    inspect.modulesbyfile[inspect.getabsfile(sys._getframe(), '<string>')] = '__main__'
+
+def _noop_worker(_) -> None:
+    pass
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PROCESS_POOL_SIZE,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_pool_worker,
+        )
+    return _process_pool
+
+def start_process_pool() -> None:
+    # Workers re-import the whole app, so spawn them once up front
+    global _pool_dispatch_overhead
+    if PROCESS_POOL_SIZE == 1:
+        return
+    pool = get_process_pool()
+    list(pool.map(_noop_worker, range(PROCESS_POOL_SIZE)))
+    start = time.perf_counter()
+    list(pool.map(_noop_worker, range(PROCESS_POOL_SIZE)))
+    _pool_dispatch_overhead = time.perf_counter() - start
+
+def _evaluate_perm_worker(args) -> float:
+    # Runs in a child process; makespan_func is top-level, so it pickles by name
+    makespan_func, ctx, perm = args
+    return makespan_func(ctx, perm)
+
+def evaluate_in_process_pool(ctx: SimulationContext, perms: List[List[int]],
+                             makespan_func: Callable[[SimulationContext, List[int]], float]) -> np.ndarray:
+    if _pool_dispatch_overhead is None or len(perms) < 2:
+        return np.array([makespan_func(ctx, perm) for perm in perms])
+    # Pool the rest of the batch only if one timed simulation says it pays off
+    start = time.perf_counter()
+    first = makespan_func(ctx, perms[0])
+    serial_cost = (time.perf_counter() - start) * (len(perms) - 1)
+    if serial_cost * (1 - 1 / PROCESS_POOL_SIZE) <= _pool_dispatch_overhead:
+        rest = [makespan_func(ctx, perm) for perm in perms[1:]]
+    else:
+        chunksize = max(1, (len(perms) - 1) // (4 * PROCESS_POOL_SIZE))
+        tasks = ((makespan_func, ctx, perm) for perm in perms[1:])
+        rest = list(get_process_pool().map(_evaluate_perm_worker, tasks, chunksize=chunksize))
+    return np.array([first] + rest)
+
+def permutation_to_scores(ctx: SimulationContext, perm: List[int]) -> List[float]:
+    # Inverse of scores_to_permutation: random keys that decode back to perm
+    position = {job_id: k for k, job_id in enumerate(perm)}
+    scale = max(len(perm) - 1, 1)
+    return [position[job_id] / scale for job_id in ctx.job_ids.tolist()]
+
+def optimize_with_random_search(instance: Instance, simulation_func, makespan_func) -> ScheduleResult:
+    # makespan_func is simulation_func's log-free counterpart, used for ranking
+    ctx = SimulationContext.from_instance(instance)
+    n = ctx.P.shape[0]
+
+    if instance.maxIterations <= 0:
+        # Fallback to the jobs in input order
+        return simulation_func(ctx, ctx.job_ids.tolist())
+
+    # Draw all maxIterations permutations (as row indices) in one vectorized call
+    rng = np.random.default_rng(instance.randomSeed)
+    perms = rng.random((instance.maxIterations, n)).argsort(axis=1).astype(np.int32)
+
+    # Rank single-machine instances with the kernel (exact for integer times,
+    # float32-approximate otherwise), the rest with the requested backend
+    if ctx.single_machine:
+        makespans = makespan_batch(ctx.P_kernel, perms)
+    else:
+        job_perms = [rows_to_job_ids(ctx, rows) for rows in perms]
+        makespans = evaluate_in_process_pool(ctx, job_perms, makespan_func)
+    best_perm = rows_to_job_ids(ctx, perms[int(np.argmin(makespans))])
+    return simulation_func(ctx, best_perm)
 
 
 # --- Heuristics & Advanced Optimization ---
 
-def get_makespan(instance: Instance, perm: List[int]) -> float:
-    res = run_simpy_simulation(instance, perm)
-    return res.makespan
+# Sort heuristics are stable argsorts over the processing-time matrix, so
+# ties keep instance.jobs order
+def spt_permutation(ctx: SimulationContext) -> List[int]:
+    return rows_to_job_ids(ctx, np.argsort(ctx.P.sum(axis=1), kind='stable'))
+
+def lpt_permutation(ctx: SimulationContext) -> List[int]:
+    return rows_to_job_ids(ctx, np.argsort(-ctx.P.sum(axis=1), kind='stable'))
+
+def first_stage_spt_permutation(ctx: SimulationContext) -> List[int]:
+    return rows_to_job_ids(ctx, np.argsort(ctx.P[:, 0], kind='stable'))
+
+def last_stage_spt_permutation(ctx: SimulationContext) -> List[int]:
+    return rows_to_job_ids(ctx, np.argsort(ctx.P[:, -1], kind='stable'))
+
+def bottleneck_permutation(ctx: SimulationContext) -> List[int]:
+    # Bottleneck stage: fewest machines, first one on ties
+    bottleneck_stage_idx = int(np.argmin(ctx.machines_per_stage))
+    return rows_to_job_ids(ctx, np.argsort(ctx.P[:, bottleneck_stage_idx], kind='stable'))
+
+def neh_permutation(ctx: SimulationContext) -> List[int]:
+    # NEH: take jobs by descending total work and insert each one at the
+    # position that minimizes the partial makespan (first such position on ties)
+    evaluate_batch = make_batch_makespan_evaluator(ctx)
+    perm: List[int] = []
+    for job_id in lpt_permutation(ctx):
+        candidates = [perm[:k] + [job_id] + perm[k:] for k in range(len(perm) + 1)]
+        perm = candidates[int(np.argmin(evaluate_batch(candidates)))]
+    return perm
+
+def johnson_permutation(ctx: SimulationContext) -> List[int]:
+    # Johnson's rule, optimal for two single-machine stages: jobs faster on
+    # stage 0 first by ascending stage-0 time, the rest by descending stage-1 time
+    first, last = ctx.P[:, 0], ctx.P[:, -1]
+    head = np.flatnonzero(first < last)
+    tail = np.flatnonzero(first >= last)
+    head = head[np.argsort(first[head], kind='stable')]
+    tail = tail[np.argsort(-last[tail], kind='stable')]
+    return rows_to_job_ids(ctx, np.concatenate([head, tail]))
+
+def solved_exactly(ctx: SimulationContext) -> bool:
+    # One or two single-machine stages: Johnson's rule is optimal, no search needed
+    return ctx.num_stages <= 2 and ctx.single_machine
+
+def seed_permutations(ctx: SimulationContext) -> List[List[int]]:
+    # Warm starts for the metaheuristics; NEH only where the kernel makes it cheap
+    seeds = [
+        spt_permutation(ctx),
+        lpt_permutation(ctx),
+        bottleneck_permutation(ctx),
+    ]
+    if ctx.single_machine:
+        seeds.insert(0, neh_permutation(ctx))
+    return [list(perm) for perm in dict.fromkeys(tuple(perm) for perm in seeds)]
+
+def warm_start_permutation(ctx: SimulationContext,
+                           get_makespan: Callable[[List[int]], float]) -> List[int]:
+    # Single starting point for the model-based searches: the best seed
+    return min(seed_permutations(ctx), key=get_makespan)
 
 def heuristic_spt(instance: Instance) -> ScheduleResult:
-    sorted_jobs = sorted(instance.jobs, key=lambda j: sum(j.processingTimes))
-    perm = [j.id for j in sorted_jobs]
-    return run_simpy_simulation(instance, perm)
+    ctx = SimulationContext.from_instance(instance)
+    return run_simpy_simulation(ctx, spt_permutation(ctx))
 
 def heuristic_lpt(instance: Instance) -> ScheduleResult:
-    sorted_jobs = sorted(instance.jobs, key=lambda j: sum(j.processingTimes), reverse=True)
-    perm = [j.id for j in sorted_jobs]
-    return run_simpy_simulation(instance, perm)
+    ctx = SimulationContext.from_instance(instance)
+    return run_simpy_simulation(ctx, lpt_permutation(ctx))
 
 def heuristic_first_stage_spt(instance: Instance) -> ScheduleResult:
-    sorted_jobs = sorted(instance.jobs, key=lambda j: j.processingTimes[0])
-    perm = [j.id for j in sorted_jobs]
-    return run_simpy_simulation(instance, perm)
+    ctx = SimulationContext.from_instance(instance)
+    return run_simpy_simulation(ctx, first_stage_spt_permutation(ctx))
 
 def heuristic_last_stage_spt(instance: Instance) -> ScheduleResult:
-    sorted_jobs = sorted(instance.jobs, key=lambda j: j.processingTimes[-1])
-    perm = [j.id for j in sorted_jobs]
-    return run_simpy_simulation(instance, perm)
+    ctx = SimulationContext.from_instance(instance)
+    return run_simpy_simulation(ctx, last_stage_spt_permutation(ctx))
 
 def heuristic_bottleneck(instance: Instance) -> ScheduleResult:
-    min_machines = min(instance.machinesPerStage)
-    bottleneck_stage_idx = instance.machinesPerStage.index(min_machines)
-    sorted_jobs = sorted(instance.jobs, key=lambda j: j.processingTimes[bottleneck_stage_idx])
-    perm = [j.id for j in sorted_jobs]
-    return run_simpy_simulation(instance, perm)
+    ctx = SimulationContext.from_instance(instance)
+    return run_simpy_simulation(ctx, bottleneck_permutation(ctx))
 
 def optimize_optuna(instance: Instance) -> ScheduleResult:
     # Notebook default: 50 trials
     n_trials = instance.maxIterations if instance.maxIterations is not None else 50
+    ctx = SimulationContext.from_instance(instance)
+    if solved_exactly(ctx):
+        return run_simpy_simulation(ctx, johnson_permutation(ctx))
+    get_makespan = make_makespan_evaluator(ctx)
+    
+    job_ids = ctx.job_ids.tolist()
     
     def objective(trial):
-        x = [trial.suggest_float(f'x_{j.id}', 0.0, 1.0) for j in instance.jobs]
-        job_scores = []
-        for i, job in enumerate(instance.jobs):
-            job_scores.append((job.id, x[i]))
-        job_scores.sort(key=lambda item: item[1])
-        perm = [item[0] for item in job_scores]
-        return get_makespan(instance, perm)
+        x = [trial.suggest_float(f'x_{job_id}', 0.0, 1.0) for job_id in job_ids]
+        return get_makespan(scores_to_permutation(ctx, x))
 
     study = optuna.create_study(direction='minimize')
+    # Start from the best heuristic seed instead of a random point
+    seed_x = permutation_to_scores(ctx, warm_start_permutation(ctx, get_makespan))
+    study.enqueue_trial({f'x_{job_id}': x for job_id, x in zip(job_ids, seed_x)})
     study.optimize(objective, n_trials=n_trials)
     
-    best_x = [study.best_params[f'x_{j.id}'] for j in instance.jobs]
-    job_scores = []
-    for i, job in enumerate(instance.jobs):
-        job_scores.append((job.id, best_x[i]))
-    job_scores.sort(key=lambda item: item[1])
-    best_perm = [item[0] for item in job_scores]
+    best_x = [study.best_params[f'x_{job_id}'] for job_id in job_ids]
+    best_perm = scores_to_permutation(ctx, best_x)
     
-    return run_simpy_simulation(instance, best_perm)
+    return run_simpy_simulation(ctx, best_perm)
+
+# gp_minimize's default number of initial points
+SKOPT_INITIAL_POINTS = 10
 
 def optimize_skopt(instance: Instance) -> ScheduleResult:
     # Notebook default: 50 calls
     n_calls = instance.maxIterations if instance.maxIterations is not None else 50
+    ctx = SimulationContext.from_instance(instance)
+    if solved_exactly(ctx):
+        return run_simpy_simulation(ctx, johnson_permutation(ctx))
+    get_makespan = make_makespan_evaluator(ctx)
     
     def objective(x):
-        job_scores = []
-        for i, job in enumerate(instance.jobs):
-            job_scores.append((job.id, x[i]))
-        job_scores.sort(key=lambda item: item[1])
-        perm = [item[0] for item in job_scores]
-        return get_makespan(instance, perm)
+        return get_makespan(scores_to_permutation(ctx, x))
 
     space = [Real(0.0, 1.0) for _ in range(instance.numJobs)]
     
     # Notebook uses random_state=0
     random_state = instance.randomSeed if instance.randomSeed is not None else 0
     
-    res = gp_minimize(objective, space, n_calls=n_calls, random_state=random_state)
+    # Start from the best heuristic seed, in place of one random initial point
+    x0 = [permutation_to_scores(ctx, warm_start_permutation(ctx, get_makespan))]
+    
+    res = gp_minimize(objective, space, n_calls=n_calls, random_state=random_state, x0=x0,
+                      n_initial_points=SKOPT_INITIAL_POINTS - len(x0))
     
-    best_x = res.x
-    job_scores = []
-    for i, job in enumerate(instance.jobs):
-        job_scores.append((job.id, best_x[i]))
-    job_scores.sort(key=lambda item: item[1])
-    best_perm = [item[0] for item in job_scores]
+    best_perm = scores_to_permutation(ctx, res.x)
     
-    return run_simpy_simulation(instance, best_perm)
+    return run_simpy_simulation(ctx, best_perm)
+
+# DEAP classes and the template toolbox are set up once at import
+if not hasattr(creator, 'FitnessMin'):
+    creator.create('FitnessMin', base.Fitness, weights=(-1.0,))
+if not hasattr(creator, 'Individual'):
+    creator.create('Individual', list, fitness=creator.FitnessMin)
+_INDIVIDUAL_CLS = creator.Individual
+
+GA_CROSSOVER_RATE = 0.9
+GA_MUT_INDPB = 0.05
+
+_ga_toolbox = base.Toolbox()
+_ga_toolbox.register('mate', tools.cxOrdered)
+_ga_toolbox.register('mutate', tools.mutShuffleIndexes, indpb=GA_MUT_INDPB)
+_ga_toolbox.register('select', tools.selTournament, tournsize=3)
 
 def optimize_deap(instance: Instance) -> ScheduleResult:
     # Notebook defaults
@@ -228,36 +504,36 @@ def optimize_deap(instance: Instance) -> ScheduleResult:
     GA_ELITISM = instance.gaElitismCount
     # Notebook default: 600 generations
     GA_N_GEN = instance.maxIterations if instance.maxIterations is not None else 600
-    GA_CROSSOVER_RATE = 0.9
-    GA_MUT_INDPB = 0.05
     
     if instance.randomSeed is not None:
         random.seed(instance.randomSeed)
 
-    if not hasattr(creator, 'FitnessMin'):
-        creator.create('FitnessMin', base.Fitness, weights=(-1.0,))
-    if not hasattr(creator, 'Individual'):
-        creator.create('Individual', list, fitness=creator.FitnessMin)
+    ctx = SimulationContext.from_instance(instance)
+    if solved_exactly(ctx):
+        return run_simpy_simulation(ctx, johnson_permutation(ctx))
 
-    toolbox = base.Toolbox()
-    job_ids = [j.id for j in instance.jobs]
-    toolbox.register('individual', tools.initIterate, creator.Individual, lambda: random.sample(job_ids, len(job_ids)))
-    toolbox.register('population', tools.initRepeat, list, toolbox.individual)
-    
-    def evaluate(ind):
-        return (get_makespan(instance, ind),)
-        
-    toolbox.register('evaluate', evaluate)
-    toolbox.register('mate', tools.cxOrdered)
-    toolbox.register('mutate', tools.mutShuffleIndexes, indpb=GA_MUT_INDPB)
+    toolbox = copy.copy(_ga_toolbox)
     toolbox.register('select', tools.selTournament, tournsize=GA_TOURN_SIZE)
-
-    pop = toolbox.population(n=GA_POP_SIZE)
+    job_ids = ctx.job_ids.tolist()
+    get_makespans = make_batch_makespan_evaluator(ctx)
+    
+    def evaluate_all(individuals):
+        # One batch call per generation, scattered back into the fitnesses
+        if not individuals:
+            return
+        for ind, value in zip(individuals, get_makespans(individuals)):
+            ind.fitness.values = (float(value),)
+
+    # Each Individual gets its own fresh fitness instance from creator
+    pop = [_INDIVIDUAL_CLS(random.sample(job_ids, len(job_ids))) for _ in range(GA_POP_SIZE)]
+    # Replace the first random individuals with heuristic warm starts
+    for ind, seed in zip(pop, seed_permutations(ctx)):
+        ind[:] = seed
     
-    for ind in pop:
-        ind.fitness.values = toolbox.evaluate(ind)
+    evaluate_all(pop)
         
     for gen in range(GA_N_GEN):
+        # Elites carry their fitness over; only altered offspring are re-evaluated
         elites = tools.selBest(pop, GA_ELITISM)
         offspring = toolbox.select(pop, len(pop)-GA_ELITISM)
         offspring = list(map(toolbox.clone, offspring))
@@ -274,46 +550,48 @@ def optimize_deap(instance: Instance) -> ScheduleResult:
                 del mutant.fitness.values
                 
         invalid = [ind for ind in offspring if not ind.fitness.valid]
-        for ind in invalid:
-            ind.fitness.values = toolbox.evaluate(ind)
+        evaluate_all(invalid)
             
         pop = elites + offspring
         
     best = tools.selBest(pop, 1)[0]
-    return run_simpy_simulation(instance, list(best))
+    return run_simpy_simulation(ctx, list(best))
 
 
 # --- Mesa Implementation ---
 
 class JobAgent(mesa.Agent):
-    def __init__(self, unique_id, model, job_data):
+    def __init__(self, unique_id, model, job_id, processing_times):
         super().__init__(model)
         self.unique_id = unique_id
-        self.job_data = job_data
+        self.job_id = job_id
+        self.processing_times = processing_times
         self.current_stage = 0
-        self.remaining_time = 0
+        self.finish_time = 0
         self.status = "waiting" # waiting, processing, done
         self.machine_assigned = -1
 
 class FlowShopModel(mesa.Model):
-    def __init__(self, instance: Instance, permutation: List[int]):
+    def __init__(self, ctx: SimulationContext, permutation: List[int],
+                 schedule_log: Optional[List[tuple]] = None):
         super().__init__()
-        self.instance = instance
+        self.num_stages = ctx.num_stages
+        self.machines_per_stage = ctx.machines_per_stage
         self.agents_list = []
-        self.machines_busy_until = [[0] * c for c in instance.machinesPerStage]
-        self.task_log = []
+        self.done_count = 0 # agents that finished their last stage
+        self.machines_busy_until = [[0] * c for c in ctx.machines_per_stage]
+        self.global_offsets = ctx.global_offsets
+        self.schedule_log = schedule_log # tasks are only logged when given
         self.current_time = 0
         self.running = True
         
         # Create Agents
         for i, job_id in enumerate(permutation):
-            job_data = next(j for j in instance.jobs if j.id == job_id)
-            a = JobAgent(i, self, job_data)
+            a = JobAgent(i, self, job_id, ctx.P[ctx.id_to_row[job_id]])
             self.agents_list.append(a)
 
     def step(self):
-        # This is a simplified tick-based simulation.
-        # In each step (tick=1 unit), we check if agents can start processing.
+        # Event-driven: handle the current time, then jump to the next completion
         
         # We iterate agents in the order added (permutation order) to give priority
         for agent in self.agents_list:
@@ -321,27 +599,28 @@ class FlowShopModel(mesa.Model):
                 continue
                 
             if agent.status == "processing":
-                agent.remaining_time -= 1
-                if agent.remaining_time <= 0:
+                if agent.finish_time <= self.current_time:
                     # Finished stage
                     agent.current_stage += 1
                     agent.status = "waiting"
                     agent.machine_assigned = -1
-                    if agent.current_stage >= self.instance.numStages:
+                    if agent.current_stage >= self.num_stages:
                         agent.status = "done"
+                        self.done_count += 1
             
             if agent.status == "waiting":
                 # Try to find a machine in current stage
                 stage = agent.current_stage
-                if stage >= self.instance.numStages:
+                if stage >= self.num_stages:
                     agent.status = "done"
+                    self.done_count += 1
                     continue
                     
-                proc_time = agent.job_data.processingTimes[stage]
+                proc_time = agent.processing_times[stage]
                 
                 # Find free machine
                 best_machine = -1
-                for m_idx in range(self.instance.machinesPerStage[stage]):
+                for m_idx in range(self.machines_per_stage[stage]):
                     if self.machines_busy_until[stage][m_idx] <= self.current_time:
                         best_machine = m_idx
                         break
@@ -349,52 +628,61 @@ class FlowShopModel(mesa.Model):
                 if best_machine != -1:
                     # Start processing
                     agent.status = "processing"
-                    agent.remaining_time = proc_time
+                    agent.finish_time = self.current_time + proc_time
                     agent.machine_assigned = best_machine
                     
                     # Reserve machine
-                    self.machines_busy_until[stage][best_machine] = self.current_time + proc_time
+                    self.machines_busy_until[stage][best_machine] = agent.finish_time
                     
                     # Log
-                    global_offset = sum(self.instance.machinesPerStage[:stage])
-                    self.task_log.append(TaskLog(
-                        jobId=agent.job_data.id,
-                        stageId=stage,
-                        machineId=best_machine,
-                        globalMachineId=global_offset + best_machine,
-                        startTime=self.current_time,
-                        endTime=self.current_time + proc_time
-                    ))
-
-        self.current_time += 1
-
-def run_mesa_simulation(instance: Instance, permutation: List[int]) -> ScheduleResult:
-    model = FlowShopModel(instance, permutation)
+                    if self.schedule_log is not None:
+                        global_offset = self.global_offsets[stage]
+                        self.schedule_log.append((
+                            agent.job_id, stage, best_machine, global_offset + best_machine,
+                            self.current_time, agent.finish_time
+                        ))
+
+        # Nothing can start before the earliest pending completion
+        pending = [a.finish_time for a in self.agents_list if a.status == "processing"]
+        if pending:
+            self.current_time = min(pending)
+
+def simulate_mesa(ctx: SimulationContext, permutation: List[int],
+                  schedule_log: Optional[List[tuple]] = None) -> float:
+    # Mesa counterpart of simulate_simpy
+    model = FlowShopModel(ctx, permutation, schedule_log)
     
     # Run until all agents done
     steps = 0
-    while any(a.status != "done" for a in model.agents_list):
+    while model.done_count < len(model.agents_list):
         model.step()
         steps += 1
         if steps > 100000: # Safety break
             break
             
-    return ScheduleResult(makespan=model.current_time, schedule=model.task_log, permutation=permutation)
+    return model.current_time
+
+def run_mesa_simulation(ctx: SimulationContext, permutation: List[int]) -> ScheduleResult:
+    schedule_log: List[tuple] = []
+    makespan = simulate_mesa(ctx, permutation, schedule_log)
+    return build_schedule_result(makespan, schedule_log, permutation)
 
 
 # --- Salabim Implementation ---
 
-def run_salabim_simulation(instance: Instance, permutation: List[int]) -> ScheduleResult:
+def simulate_salabim(ctx: SimulationContext, permutation: List[int],
+                     schedule_log: Optional[List[tuple]] = None) -> float:
+    # Salabim counterpart of simulate_simpy
     sim.yieldless(False) # Required for generator-based processes in newer Salabim
     env = sim.Environment(trace=False)
     
     # Resources
     machines = []
-    for s, count in enumerate(instance.machinesPerStage):
+    for s, count in enumerate(ctx.machines_per_stage):
         # Salabim Resource
         machines.append(sim.Resource(name=f'Stage_{s}', capacity=count, env=env))
         
-    schedule_log = []
+    global_offsets = ctx.global_offsets
     
     class JobComponent(sim.Component):
         def setup(self, job_id, processing_times):
@@ -411,48 +699,44 @@ def run_salabim_simulation(instance: Instance, permutation: List[int]) -> Schedu
                 end_time = env.now()
                 
                 # Log
-                global_offset = sum(instance.machinesPerStage[:s])
-                schedule_log.append(TaskLog(
-                    jobId=self.job_id,
-                    stageId=s,
-                    machineId=0,
-                    globalMachineId=global_offset,
-                    startTime=start_time,
-                    endTime=end_time
-                ))
+                if schedule_log is not None:
+                    global_offset = global_offsets[s]
+                    schedule_log.append((self.job_id, s, 0, global_offset, start_time, end_time))
                 
                 self.release(machines[s])
 
     # Create components in order
     for i, job_id in enumerate(permutation):
-        job_data = next(j for j in instance.jobs if j.id == job_id)
-        JobComponent(job_id=job_id, processing_times=job_data.processingTimes, env=env)
+        JobComponent(job_id=job_id, processing_times=ctx.P[ctx.id_to_row[job_id]], env=env)
         
     env.run()
-    
-    return ScheduleResult(makespan=env.now(), schedule=schedule_log, permutation=permutation)
+    return env.now()
 
+def run_salabim_simulation(ctx: SimulationContext, permutation: List[int]) -> ScheduleResult:
+    schedule_log: List[tuple] = []
+    makespan = simulate_salabim(ctx, permutation, schedule_log)
+    return build_schedule_result(makespan, schedule_log, permutation)
 
-# --- API Endpoints ---
 
+# --- API Endpoints ---
 @app.post("/api/optimize/simpy", response_model=ScheduleResult)
 async def optimize_simpy(instance: Instance):
     try:
-        return optimize_with_random_search(instance, run_simpy_simulation)
+        return optimize_with_random_search(instance, run_simpy_simulation, simulate_simpy)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/optimize/mesa", response_model=ScheduleResult)
 async def optimize_mesa(instance: Instance):
     try:
-        return optimize_with_random_search(instance, run_mesa_simulation)
+        return optimize_with_random_search(instance, run_mesa_simulation, simulate_mesa)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/optimize/salabim", response_model=ScheduleResult)
 async def optimize_salabim(instance: Instance):
     try:
-        return optimize_with_random_search(instance, run_salabim_simulation)
+        return optimize_with_random_search(instance, run_salabim_simulation, simulate_salabim)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -515,7 +799,7 @@ async def endpoint_bottleneck(instance: Instance):
 @app.post("/api/optimize/random", response_model=ScheduleResult)
 async def endpoint_random(instance: Instance):
     try:
-        return optimize_with_random_search(instance, run_simpy_simulation)
+        return optimize_with_random_search(instance, run_simpy_simulation, simulate_simpy)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 